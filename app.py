@@ -1,63 +1,241 @@
 # app.py
 import streamlit as st
-import pandas as pd
+import numpy as np
 import math
 import requests
 import logging
+import hashlib
+import threading
+import time
 import json
-from datetime import datetime
+import orjson
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # Set up logging to show debug information
 logging.basicConfig(level=logging.INFO)
 
+SYMBOLS = ("NIFTY", "BANKNIFTY")
+
+HEADERS = {
+    'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36',
+    'Accept-Language': 'en-US,en;q=0.9',
+}
+
+NSE_HOME_URL = "https://www.nseindia.com/"
+
+# NSE's API cookies expire after a few minutes of use, so the homepage is revisited on this interval
+NSE_COOKIE_TTL_SECONDS = 600
+
+# (connect, read) seconds: fail fast on a dead connection, still allow a slow option-chain body
+REQUEST_TIMEOUT = (3, 10)
+
+# How long fetched NSE payloads are reused across reruns and sessions
+CACHE_TTL_SECONDS = 30
+
+# Styles shared by the dashboard cards, used to replicate the local UI design
+DASHBOARD_CSS = """
+    <style>
+        .main-container {
+            padding: 2rem;
+            border-radius: 0.75rem;
+            box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
+        }
+        .card-grid {
+            display: grid;
+            grid-template-columns: repeat(4, 1fr);
+            gap: 1rem;
+        }
+        /* Narrow screens get two cards per row so values like "₹ 48523.45" fit without overflowing */
+        @media (max-width: 640px) {
+            .card-grid { grid-template-columns: repeat(2, 1fr); }
+        }
+        .card {
+            background-color: #e5e7eb; /* Corresponds to gray-200 */
+            padding: 1rem;
+            border-radius: 0.5rem;
+            text-align: center;
+            color: #1f2937; /* Add this line for dark text color */
+        }
+        .blue-card {
+            background-color: #dbeafe; /* Corresponds to blue-100 */
+            color: #1f2937; /* Add this line for dark text color */
+        }
+        .signal-card {
+            background-color: #f9fafb; /* Corresponds to gray-50 */
+            padding: 1.5rem;
+            border-radius: 0.5rem;
+            text-align: center;
+        }
+        .signal-text {
+            font-size: 1.5rem;
+            font-weight: bold;
+        }
+        .green-text { color: #22c55e; } /* green-500 */
+        .red-text { color: #ef4444; } /* red-500 */
+        .yellow-text { color: #eab308; } /* yellow-500 */
+    </style>
+"""
+
 # --- Data Fetching Functions ---
+# Cached as a resource because Streamlit re-executes this module on every rerun; a plain
+# module-level session would be rebuilt each time, losing its pooled connections and cookies.
+@st.cache_resource
+def get_session():
+    """
+    Returns the process-wide NSE session with browser headers, keep-alive pooling and retries.
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    # NSE's gateway throws transient 429/5xx responses, so let urllib3 retry those with backoff.
+    # Connect failures are cheap to retry; a stalled read already cost a full read timeout, so only retry it once.
+    session.mount("https://", HTTPAdapter(
+        pool_connections=4,
+        pool_maxsize=8,
+        max_retries=Retry(total=3, connect=3, read=1, backoff_factor=0.3, status_forcelist=[429, 500, 502, 503, 504]),
+    ))
+    return session
+
+@st.cache_resource
+def get_cookie_state():
+    """
+    Returns the lock and last-primed time guarding the shared session's NSE cookies.
+    """
+    return {'lock': threading.Lock(), 'primed_at': None}
+
+def prime_nse_cookies(rejected_at=None):
+    """
+    Visits the NSE homepage so the shared session carries the cookies its API endpoints require.
+    Pass rejected_at (a time.monotonic() value) when NSE refused a request sent at that time.
+    """
+    state = get_cookie_state()
+    # The lock keeps concurrent fetches from all hitting the homepage at once
+    with state['lock']:
+        primed_at = state['primed_at']
+        if primed_at is not None:
+            if rejected_at is None and time.monotonic() - primed_at < NSE_COOKIE_TTL_SECONDS:
+                return
+            # Another fetch re-primed after the rejected request went out, so the cookies are already fresh
+            if rejected_at is not None and primed_at > rejected_at:
+                return
+        logging.info("Fetching cookies from NSE...")
+        response = get_session().get(NSE_HOME_URL, timeout=REQUEST_TIMEOUT)
+        response.raise_for_status()
+        state['primed_at'] = time.monotonic()
+
+def get_nse_response(url, headers=None):
+    """
+    Performs a GET on the shared session, re-priming the NSE cookies once if they were rejected.
+    """
+    session = get_session()
+    sent_at = time.monotonic()
+    response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    if response.status_code in (401, 403):
+        prime_nse_cookies(rejected_at=sent_at)
+        response = session.get(url, headers=headers, timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return response
+
+@st.cache_resource
+def get_validator_cache():
+    """
+    Returns the last ETag/Last-Modified, body digest and decoded payload seen for each NSE URL.
+    """
+    return {}
+
+def fetch_nse_json(url):
+    """
+    Fetches and decodes an NSE JSON endpoint, reusing the last payload when NSE reports or sends it unchanged.
+    """
+    validators = get_validator_cache()
+    cached = validators.get(url)
+    headers = {}
+    if cached:
+        if cached['etag']:
+            headers['If-None-Match'] = cached['etag']
+        if cached['last_modified']:
+            headers['If-Modified-Since'] = cached['last_modified']
+
+    response = get_nse_response(url, headers=headers)
+    # 304 Not Modified carries no body, so the payload decoded last time is still current
+    if response.status_code == 304 and cached:
+        return cached['data']
+
+    # Without validators NSE always sends a full body, so an identical one still skips the JSON decode
+    digest = hashlib.blake2b(response.content, digest_size=16).digest()
+    if cached and cached['digest'] == digest:
+        data = cached['data']
+    else:
+        data = orjson.loads(response.content)
+
+    validators[url] = {
+        'etag': response.headers.get('ETag'),
+        'last_modified': response.headers.get('Last-Modified'),
+        'digest': digest,
+        'data': data,
+    }
+    return data
+
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
 def fetch_option_chain_from_api(symbol='BANKNIFTY'):
     """
     Fetches live option chain data from a third-party API.
     """
     api_url = f"https://www.nseindia.com/api/option-chain-indices?symbol={symbol}"
-    
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36',
-        'Accept-Language': 'en-US,en;q=0.9',
-    }
 
-    try:
-        logging.info(f"Fetching data from third-party API for {symbol}...")
-        response = requests.get(api_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        logging.info("Data fetched successfully.")
-        return data
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching data from API for {symbol}: {e}")
-        raise Exception(f"Failed to fetch data. Error: {e}")
+    logging.info("Fetching data from third-party API for %s...", symbol)
+    data = fetch_nse_json(api_url)
+    logging.info("Data fetched successfully.")
+    return data
 
+@st.cache_data(ttl=CACHE_TTL_SECONDS, show_spinner=False)
 def fetch_vix_data():
     """
     Fetches the India VIX value from a public NSE API.
     """
     vix_api_url = "https://www.nseindia.com/api/all-indices"
-    headers = {
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36',
-        'Accept-Language': 'en-US,en;q=0.9',
-    }
     
+    logging.info("Fetching India VIX data...")
+    data = fetch_nse_json(vix_api_url)
+    
+    for index in data.get('data', []):
+        if index.get('index') == 'India VIX':
+            return index.get('lastPrice')
+    
+    logging.warning("India VIX data not found in the response.")
+    return None
+
+def fetch_all_data(symbols=SYMBOLS):
+    """
+    Fetches the option chains for all symbols and the India VIX value concurrently.
+    """
+    # Prime once up front so the concurrent requests below don't each hit the homepage
     try:
-        logging.info("Fetching India VIX data...")
-        response = requests.get(vix_api_url, headers=headers, timeout=10)
-        response.raise_for_status()
-        data = response.json()
-        
-        for index in data.get('data', []):
-            if index.get('index') == 'India VIX':
-                return index.get('lastPrice')
-        
-        logging.warning("India VIX data not found in the response.")
-        return None
+        prime_nse_cookies()
     except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching India VIX data: {e}")
-        return None
+        logging.warning("Could not fetch NSE cookies: %s", e)
+
+    # All requests are network bound, so threads overlap the waits on the shared session pool.
+    # Failures are handled here rather than in the cached fetchers, so a transient error is never cached.
+    with ThreadPoolExecutor(max_workers=len(symbols) + 1) as executor:
+        chain_futures = {symbol: executor.submit(fetch_option_chain_from_api, symbol) for symbol in symbols}
+        vix_future = executor.submit(fetch_vix_data)
+
+        chains = {}
+        for symbol, future in chain_futures.items():
+            try:
+                chains[symbol] = future.result()
+            except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+                logging.error("Error fetching data from API for %s: %s", symbol, e)
+                raise Exception(f"Failed to fetch data. Error: {e}")
+
+        try:
+            vix_value = vix_future.result()
+        except (requests.exceptions.RequestException, orjson.JSONDecodeError) as e:
+            logging.error("Error fetching India VIX data: %s", e)
+            vix_value = None
+        return chains, vix_value
 
 def compute_oi_pcr_and_underlying(data):
     """
@@ -71,22 +249,17 @@ def compute_oi_pcr_and_underlying(data):
         raise ValueError("No expiry dates found in the data.")
         
     current_expiry = expiry_dates[0]
-    
-    pe_total_oi = 0
-    ce_total_oi = 0
-    pe_near_oi = 0
-    ce_near_oi = 0
 
     underlying_price = data['records']['underlyingValue']
     
-    for item in data['records']['data']:
-        pe_total_oi += item.get('PE', {}).get('openInterest', 0)
-        ce_total_oi += item.get('CE', {}).get('openInterest', 0)
-        
-        # Check for near expiry data
-        if item.get('expiryDate') == current_expiry:
-            pe_near_oi += item.get('PE', {}).get('openInterest', 0)
-            ce_near_oi += item.get('CE', {}).get('openInterest', 0)
+    # Pull only the two OI fields and the expiry out of each strike row; a missing CE/PE leg counts as zero OI
+    rows = data['records']['data']
+    pe_oi = np.fromiter((pe.get('openInterest', 0) if (pe := r.get('PE')) else 0 for r in rows), dtype=np.float64, count=len(rows))
+    ce_oi = np.fromiter((ce.get('openInterest', 0) if (ce := r.get('CE')) else 0 for r in rows), dtype=np.float64, count=len(rows))
+    near_mask = np.array([r.get('expiryDate') == current_expiry for r in rows], dtype=bool)
+
+    pe_total_oi, ce_total_oi = pe_oi.sum(), ce_oi.sum()
+    pe_near_oi, ce_near_oi = pe_oi[near_mask].sum(), ce_oi[near_mask].sum()
 
     pcr_total = pe_total_oi / ce_total_oi if ce_total_oi != 0 else math.inf
     pcr_near = pe_near_oi / ce_near_oi if ce_near_oi != 0 else math.inf
@@ -131,60 +304,32 @@ def get_vix_label(vix_value):
     else:
         return {"value": vix_value, "label": "High Volatility", "advice": "The market has very high volatility. Trade with great caution or avoid trading."}
 
+def inject_css():
+    """
+    Emits the dashboard styles; called once per run from main() rather than per dashboard render.
+    """
+    st.markdown(DASHBOARD_CSS, unsafe_allow_html=True)
+
 def display_dashboard(symbol, info, signal, suggested_side, vix_data):
     """
     Displays the dashboard for a given symbol, including the trade log feature and VIX.
     """
-    # Use HTML to replicate the local UI design
-    st.markdown("""
-        <style>
-            .main-container {
-                padding: 2rem;
-                border-radius: 0.75rem;
-                box-shadow: 0 4px 6px rgba(0, 0, 0, 0.1);
-            }
-            .card {
-                background-color: #e5e7eb; /* Corresponds to gray-200 */
-                padding: 1rem;
-                border-radius: 0.5rem;
-                text-align: center;
-                color: #1f2937; /* Add this line for dark text color */
-            }
-            .blue-card {
-                background-color: #dbeafe; /* Corresponds to blue-100 */
-                color: #1f2937; /* Add this line for dark text color */
-            }
-            .signal-card {
-                background-color: #f9fafb; /* Corresponds to gray-50 */
-                padding: 1.5rem;
-                border-radius: 0.5rem;
-                text-align: center;
-            }
-            .signal-text {
-                font-size: 1.5rem;
-                font-weight: bold;
-            }
-            .green-text { color: #22c55e; } /* green-500 */
-            .red-text { color: #ef4444; } /* red-500 */
-            .yellow-text { color: #eab308; } /* yellow-500 */
-        </style>
-    """, unsafe_allow_html=True)
-
     # Main container
     st.markdown('<div class="main-container">', unsafe_allow_html=True)
     
     st.subheader(f"{symbol} Option Chain Dashboard", help="Live analysis based on PCR strategy.")
     st.divider()
 
-    col1, col2, col3, col4 = st.columns(4)
-    with col1:
-        st.markdown(f'<div class="card blue-card">Live Price<div style="font-size:1.5rem; font-weight: bold;">₹ {info["underlying"]:.2f}</div></div>', unsafe_allow_html=True)
-    with col2:
-        st.markdown(f'<div class="card">PCR<div style="font-size:1.5rem; font-weight: bold;">{info["pcr_total"]:.2f}</div></div>', unsafe_allow_html=True)
-    with col3:
-        st.markdown(f'<div class="card">Trend<div style="font-size:1.5rem; font-weight: bold;">{info["trend"]}</div></div>', unsafe_allow_html=True)
-    with col4:
-        st.markdown(f'<div class="card">India VIX<div style="font-size:1.5rem; font-weight: bold;">{vix_data["value"]:.2f}</div><div style="font-size:0.8rem;">{vix_data["label"]}</div></div>', unsafe_allow_html=True)
+    # The four cards go out as one CSS-grid element rather than four columns with a markdown call each
+    st.markdown(
+        '<div class="card-grid">'
+        f'<div class="card blue-card">Live Price<div style="font-size:1.5rem; font-weight: bold;">₹ {info["underlying"]:.2f}</div></div>'
+        f'<div class="card">PCR<div style="font-size:1.5rem; font-weight: bold;">{info["pcr_total"]:.2f}</div></div>'
+        f'<div class="card">Trend<div style="font-size:1.5rem; font-weight: bold;">{info["trend"]}</div></div>'
+        f'<div class="card">India VIX<div style="font-size:1.5rem; font-weight: bold;">{vix_data["value"]:.2f}</div><div style="font-size:0.8rem;">{vix_data["label"]}</div></div>'
+        '</div>',
+        unsafe_allow_html=True,
+    )
 
     st.markdown("---")
     st.subheader("Market Volatility Advice")
@@ -195,9 +340,9 @@ def display_dashboard(symbol, info, signal, suggested_side, vix_data):
     
     # Show explicit buy/sell action on CE/PE
     if signal == "BUY":
-        st.success(f"Signal: BUY CE - At-The-Money option suggested: ₹{round(info['underlying']/100)*100} CE")
+        st.success(f"Signal: BUY CE - At-The-Money option suggested: ₹{info['atm']} CE")
     elif signal == "SELL":
-        st.error(f"Signal: SELL PE - At-The-Money option suggested: ₹{round(info['underlying']/100)*100} PE")
+        st.error(f"Signal: SELL PE - At-The-Money option suggested: ₹{info['atm']} PE")
     else:
         st.info("Signal: SIDEWAYS - No strong signal found.")
         
@@ -208,23 +353,141 @@ def display_dashboard(symbol, info, signal, suggested_side, vix_data):
 
     st.markdown('</div>', unsafe_allow_html=True)
     
-def display_simulated_sms(phone_number, message_type, trade_details):
+@st.fragment
+def render_dashboard():
     """
-    Displays a simulated SMS message in the Streamlit app.
+    Renders the symbol picker and its dashboard; switching symbols reruns only this fragment.
     """
-    if not phone_number:
-        return
+    symbol_choice = st.radio(
+        "Select Symbol",
+        ["NIFTY", "BANKNIFTY"],
+        index=0,
+        horizontal=True
+    )
 
-    full_message = f"Number: {phone_number}\n"
-    if message_type == "entry":
-        full_message += f"New Trade: {trade_details['Symbol']} with a {trade_details['Signal']} signal. Entry Price: ₹{trade_details['Entry Price']:.2f}"
-    elif message_type == "exit":
-        full_message += f"Trade Closed: {trade_details['Symbol']} trade has been closed. Exit Price: ₹{trade_details['Current Price']:.2f}. P&L: ₹{trade_details['Final P&L']:.2f}"
+    info = st.session_state[f"{symbol_choice.lower()}_data"]
+    if info:
+        display_dashboard(symbol_choice, info, info['signal'], info['suggested_side'], info['vix_data'])
+    else:
+        st.info("Please select a symbol and click 'Refresh Data' to view the dashboard.")
+
+def build_trade_log_df(trade_log):
+    """
+    Builds the trade-log table with a single numeric P&L column for display.
+    """
+    # pandas is only needed once a trade has been logged, so it stays off the cold-start path
+    import pandas as pd
+
+    df_log = pd.DataFrame(trade_log)
+    
+    # Live P&L for open trades, final P&L for closed ones
+    df_log['P&L (Live/Final)'] = np.where(df_log['Status'].eq('Active'), df_log['P&L'], df_log['Final P&L']).astype(float)
     
+    return df_log.drop(columns=['P&L', 'Final P&L'])
+
+def style_pnl_rows(df):
+    """
+    Returns row background styles for the trade log based on the sign of the P&L column.
+    """
+    import pandas as pd
+
+    pnl = df['P&L (Live/Final)'].to_numpy()
+    colors = np.where(pnl > 0, 'background: #d4edda', np.where(pnl < 0, 'background: #f8d7da', ''))
+    return pd.DataFrame(np.repeat(colors[:, None], df.shape[1], axis=1), index=df.index, columns=df.columns)
+
+def build_sms_message(message_type, trade_details):
+    """
+    Builds the text of a simulated SMS for a trade entry or exit.
+    """
+    if message_type == "entry":
+        return f"New Trade: {trade_details['Symbol']} with a {trade_details['Signal']} signal. Entry Price: ₹{trade_details['Entry Price']:.2f}"
+    return f"Trade Closed: {trade_details['Symbol']} trade has been closed. Exit Price: ₹{trade_details['Current Price']:.2f}. P&L: ₹{trade_details['Final P&L']:.2f}"
+
+def display_simulated_sms(phone_number, messages):
+    """
+    Displays the simulated SMS messages from one refresh in the Streamlit sidebar.
+    """
+    if not phone_number or not messages:
+        return
+
+    # One sidebar block per refresh, however many trades were opened or closed
+    full_message = f"Number: {phone_number}\n" + "\n\n".join(messages)
     st.sidebar.markdown("---")
-    st.sidebar.subheader("SMS Notification")
+    st.sidebar.subheader("SMS Notifications")
     st.sidebar.info(full_message)
 
+def update_trade_log(lot_size, phone_number):
+    """
+    Refreshes live P&L and auto-exits open trades, then auto-logs new trades from the latest signals.
+    """
+    exit_time = time.strftime("%Y-%m-%d %H:%M:%S")
+    sms_messages = []
+
+    # Both symbols are refreshed together, so trades are exited and logged for each of them
+    # independently of which dashboard is on screen.
+    for symbol in SYMBOLS:
+        current_info = st.session_state[f"{symbol.lower()}_data"]
+        if not current_info:
+            continue
+        current_price = current_info['underlying']
+        current_signal = current_info['signal']
+        open_trades = st.session_state.active_trades[symbol]
+
+        # Refresh live P&L and auto-exit this symbol's open trades in place.
+        # Each entry is the dict stored in the log, so mutating it updates the log directly.
+        for timestamp, entry in list(open_trades.items()):
+            if not current_price:
+                break
+
+            if entry['Signal'] == "BUY":
+                pnl = (current_price - entry['Entry Price']) * entry['Lot Size']
+            else:
+                pnl = (entry['Entry Price'] - current_price) * entry['Lot Size']
+
+            entry['Current Price'] = current_price
+
+            if (current_signal == "SELL" and entry['Signal'] == "BUY") or \
+               (current_signal == "BUY" and entry['Signal'] == "SELL") or \
+               (current_signal == "SIDEWAYS"):
+                entry['Status'] = "Closed"
+                entry['Exit Time'] = exit_time
+                entry['P&L'] = 0.0
+                entry['Final P&L'] = pnl
+                del open_trades[timestamp]
+                st.session_state.trade_log_version += 1
+                st.success(f"Trade for {symbol} has been auto-exited. Final P&L: ₹{pnl:.2f}")
+                sms_messages.append(build_sms_message("exit", entry))
+            else:
+                entry['P&L'] = pnl
+
+        if current_signal == "SIDEWAYS":
+            continue
+        log_key = f"{symbol}_{current_signal}"
+        if st.session_state.last_logged_signal.get(log_key) != current_info['last_update']:
+            
+            log_entry = {
+                "Timestamp": current_info['last_update'],
+                "Symbol": symbol,
+                "Signal": current_signal,
+                "Suggested Option": current_info['atm_label'],
+                "Entry Price": current_info['underlying'],
+                "Exit Time": "-",
+                "Current Price": current_info['underlying'],
+                "P&L": 0.0,
+                "Final P&L": "-",
+                "Used PCR": current_info['used_pcr_str'],
+                "Lot Size": lot_size,
+                "Status": "Active"
+            }
+            st.session_state.trade_log.append(log_entry)
+            open_trades[log_entry['Timestamp']] = log_entry
+            st.session_state.last_logged_signal[log_key] = current_info['last_update']
+            st.session_state.trade_log_version += 1
+            
+            sms_messages.append(build_sms_message("entry", log_entry))
+
+    display_simulated_sms(phone_number, sms_messages)
+
 def main():
     """
     Main function to run the Streamlit app.
@@ -236,6 +499,8 @@ def main():
         initial_sidebar_state="collapsed",
     )
     
+    inject_css()
+    
     st.title("NSE Option Chain Analysis Dashboard")
     st.markdown("This dashboard provides live analysis of NIFTY and BANKNIFTY based on a custom trading strategy.")
 
@@ -248,6 +513,22 @@ def main():
         st.session_state.banknifty_data = None
     if 'last_logged_signal' not in st.session_state:
         st.session_state.last_logged_signal = {}
+    # Open trades per symbol, keyed by Timestamp; values are the same dicts stored in trade_log
+    if 'active_trades' not in st.session_state:
+        st.session_state.active_trades = {symbol: {} for symbol in SYMBOLS}
+        for entry in st.session_state.trade_log:
+            if entry['Status'] == "Active":
+                st.session_state.active_trades[entry['Symbol']][entry['Timestamp']] = entry
+    # Bumped on every successful refresh; the trade bookkeeping only runs for unseen versions
+    if 'data_version' not in st.session_state:
+        st.session_state.data_version = 0
+        st.session_state.last_pnl_version = -1
+    # Bumped whenever trade-log contents change so the rendered table is only rebuilt then
+    if 'trade_log_version' not in st.session_state:
+        st.session_state.trade_log_version = 0
+    if 'trade_log_df' not in st.session_state:
+        st.session_state.trade_log_df = None
+        st.session_state.trade_log_df_version = -1
     
     # --- UI for user inputs in the sidebar ---
     st.sidebar.header("Settings")
@@ -266,159 +547,75 @@ def main():
     lot_size = st.sidebar.number_input("Lot Size", min_value=1, value=1, step=1)
 
     refresh_button = st.sidebar.button("Refresh Data")
-    
-    # UI for symbol selection on the main page
-    symbol_choice = st.radio(
-        "Select Symbol",
-        ["NIFTY", "BANKNIFTY"],
-        index=0,
-        horizontal=True
-    )
 
     # --- Data Fetching and Display Logic ---
     
+    # An explicit refresh bypasses the TTL cache
+    if refresh_button:
+        fetch_option_chain_from_api.clear()
+        fetch_vix_data.clear()
+
     # Fetch data only if refresh button is clicked or if data is not yet available
     if refresh_button or (st.session_state.nifty_data is None and st.session_state.banknifty_data is None):
         try:
-            with st.spinner(f"Fetching live data for {symbol_choice}... Please wait."):
-                data = fetch_option_chain_from_api(symbol_choice)
-                info = compute_oi_pcr_and_underlying(data)
-                vix_value = fetch_vix_data()
+            with st.spinner("Fetching live data for NIFTY and BANKNIFTY... Please wait."):
+                chains, vix_value = fetch_all_data()
             
             vix_data = get_vix_label(vix_value)
-            pcr_used = info['pcr_near'] if use_near_pcr else info['pcr_total']
-            trend = "BULLISH" if pcr_used >= 1 else "BEARISH"
+            last_update = time.strftime("%Y-%m-%d %H:%M:%S")
             
-            # Use the imported function from signal_strategy.py
-            signal, suggested_side = determine_signal(pcr_used, trend, ema_signal_choice)
+            for symbol, data in chains.items():
+                info = compute_oi_pcr_and_underlying(data)
+                pcr_used = info['pcr_near'] if use_near_pcr else info['pcr_total']
+                trend = "BULLISH" if pcr_used >= 1 else "BEARISH"
+                
+                signal, suggested_side = determine_signal(pcr_used, trend, ema_signal_choice)
+                atm = round(info['underlying'] / 100) * 100
+                
+                # Store calculated info in session state
+                st.session_state[f"{symbol.lower()}_data"] = {
+                    'underlying': info['underlying'],
+                    'pcr_total': info['pcr_total'],
+                    'pcr_near': info['pcr_near'],
+                    'last_update': last_update,
+                    'use_near_pcr': use_near_pcr,
+                    'pcr_used': pcr_used,
+                    'used_pcr_str': f"{pcr_used:.2f}",
+                    'atm': atm,
+                    'atm_label': f"₹{atm} {suggested_side}",
+                    'trend': trend,
+                    'ema_signal': ema_signal_choice,
+                    'signal': signal,
+                    'suggested_side': suggested_side,
+                    'lot_size': lot_size,
+                    'vix_data': vix_data
+                }
             
-            # Store calculated info in session state
-            current_data = {
-                'underlying': info['underlying'],
-                'pcr_total': info['pcr_total'],
-                'pcr_near': info['pcr_near'],
-                'last_update': datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                'use_near_pcr': use_near_pcr,
-                'pcr_used': pcr_used,
-                'trend': trend,
-                'ema_signal': ema_signal_choice,
-                'signal': signal,
-                'suggested_side': suggested_side,
-                'lot_size': lot_size,
-                'vix_data': vix_data
-            }
-
-            if symbol_choice == 'NIFTY':
-                st.session_state.nifty_data = current_data
-            elif symbol_choice == 'BANKNIFTY':
-                st.session_state.banknifty_data = current_data
+            # New prices change the live P&L of open trades
+            st.session_state.data_version += 1
+            st.session_state.trade_log_version += 1
             
         except Exception as e:
-            st.error(f"Error fetching data for {symbol_choice}: {e}")
+            st.error(f"Error fetching data: {e}")
             st.info("Please click 'Refresh Data' to try again.")
 
     # --- Auto-Log and P&L Update Logic ---
-    current_info = None
-    if symbol_choice == 'NIFTY' and st.session_state.nifty_data:
-        current_info = st.session_state.nifty_data
-    elif symbol_choice == 'BANKNIFTY' and st.session_state.banknifty_data:
-        current_info = st.session_state.banknifty_data
-
-    if current_info and current_info['signal'] != "SIDEWAYS":
-        log_key = f"{symbol_choice}_{current_info['signal']}"
-        if st.session_state.last_logged_signal.get(log_key) != current_info['last_update']:
-            
-            log_entry = {
-                "Timestamp": current_info['last_update'],
-                "Symbol": symbol_choice,
-                "Signal": current_info['signal'],
-                "Suggested Option": f"₹{round(current_info['underlying']/100)*100} {current_info['suggested_side']}",
-                "Entry Price": current_info['underlying'],
-                "Exit Time": "-",
-                "Current Price": current_info['underlying'],
-                "P&L": 0.0,
-                "Final P&L": "-",
-                "Used PCR": f"{current_info['pcr_used']:.2f}",
-                "Lot Size": lot_size,
-                "Status": "Active"
-            }
-            st.session_state.trade_log.append(log_entry)
-            st.session_state.last_logged_signal[log_key] = current_info['last_update']
-            
-            display_simulated_sms(phone_number, "entry", log_entry)
-
-    current_nifty_price = st.session_state.nifty_data['underlying'] if st.session_state.nifty_data else None
-    current_banknifty_price = st.session_state.banknifty_data['underlying'] if st.session_state.banknifty_data else None
-    current_signal_for_exit = current_info['signal'] if current_info else None
+    # Prices and signals only change on refresh, so reruns from pure UI interaction skip the bookkeeping
+    if st.session_state.last_pnl_version != st.session_state.data_version:
+        update_trade_log(lot_size, phone_number)
+        st.session_state.last_pnl_version = st.session_state.data_version
 
-    for entry in list(st.session_state.trade_log):
-        if entry['Status'] == "Active" and entry['Symbol'] == symbol_choice:
-            if (current_signal_for_exit == "SELL" and entry['Signal'] == "BUY") or \
-               (current_signal_for_exit == "BUY" and entry['Signal'] == "SELL") or \
-               (current_signal_for_exit == "SIDEWAYS"):
-                
-                current_price = None
-                if entry['Symbol'] == 'NIFTY' and current_nifty_price:
-                    current_price = current_nifty_price
-                elif entry['Symbol'] == 'BANKNIFTY' and current_banknifty_price:
-                    current_price = current_banknifty_price
-                
-                if current_price:
-                    for original_entry in st.session_state.trade_log:
-                        if original_entry['Timestamp'] == entry['Timestamp'] and original_entry['Symbol'] == entry['Symbol']:
-                            original_entry['Status'] = "Closed"
-                            original_entry['Exit Time'] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                            original_entry['Current Price'] = current_price
-                            pnl_calc = (current_price - original_entry['Entry Price']) * original_entry['Lot Size'] if original_entry['Signal'] == "BUY" else (original_entry['Entry Price'] - current_price) * original_entry['Lot Size']
-                            original_entry['P&L'] = 0.0
-                            original_entry['Final P&L'] = pnl_calc
-                            st.success(f"Trade for {original_entry['Symbol']} has been auto-exited. Final P&L: ₹{pnl_calc:.2f}")
-                            display_simulated_sms(phone_number, "exit", original_entry)
-                            break
-    
-    for entry in st.session_state.trade_log:
-        if entry['Status'] == "Active":
-            current_symbol = entry['Symbol']
-            current_signal = entry['Signal']
-            current_entry_price = entry['Entry Price']
-            
-            if current_symbol == 'NIFTY' and current_nifty_price:
-                current_price = current_nifty_price
-            elif current_symbol == 'BANKNIFTY' and current_banknifty_price:
-                current_price = current_banknifty_price
-            else:
-                continue
-
-            if current_signal == "BUY":
-                pnl = (current_price - current_entry_price) * entry['Lot Size']
-            else:
-                pnl = (current_entry_price - current_price) * entry['Lot Size']
-
-            entry['Current Price'] = current_price
-            entry['P&L'] = pnl
-
-    if symbol_choice == 'NIFTY' and st.session_state.nifty_data:
-        info = st.session_state.nifty_data
-        display_dashboard(symbol_choice, info, info['signal'], info['suggested_side'], info['vix_data'])
-    elif symbol_choice == 'BANKNIFTY' and st.session_state.banknifty_data:
-        info = st.session_state.banknifty_data
-        display_dashboard(symbol_choice, info, info['signal'], info['suggested_side'], info['vix_data'])
-    else:
-        st.info("Please select a symbol and click 'Refresh Data' to view the dashboard.")
+    render_dashboard()
     
     st.subheader("Trade Log")
     if st.session_state.trade_log:
-        display_log = []
-        for entry in st.session_state.trade_log:
-            display_entry = entry.copy()
-            display_entry['P&L (Live/Final)'] = f"₹{display_entry['P&L']:.2f}" if display_entry['Status'] == 'Active' else f"₹{display_entry['Final P&L']:.2f}"
-            display_log.append(display_entry)
-        
-        df_log = pd.DataFrame(display_log)
-        
-        df_log = df_log.drop(columns=['P&L', 'Final P&L'])
+        if st.session_state.trade_log_df_version != st.session_state.trade_log_version:
+            st.session_state.trade_log_df = build_trade_log_df(st.session_state.trade_log)
+            st.session_state.trade_log_df_version = st.session_state.trade_log_version
+        df_log = st.session_state.trade_log_df
         
-        st.dataframe(df_log.style.apply(lambda x: ['background: #d4edda' if '₹' in str(x['P&L (Live/Final)']) and float(str(x['P&L (Live/Final)']).replace('₹', '')) > 0 else 'background: #f8d7da' if '₹' in str(x['P&L (Live/Final)']) and float(str(x['P&L (Live/Final)']).replace('₹', '')) < 0 else '' for i in x], axis=1))
+        # Keep P&L numeric so row colours come from one vectorized comparison, formatting only for display
+        st.dataframe(df_log.style.apply(style_pnl_rows, axis=None).format({'P&L (Live/Final)': '₹{:.2f}'}))
     else:
         st.info("Trade log is empty. Log a trade above.")
     
@@ -1,107 +1,115 @@
 # new_app.py
 import streamlit as st
-import time
-import pandas as pd
-import math
-import json
-import requests
+import asyncio
+import aiohttp
 import logging
+import time
+from streamlit_autorefresh import st_autorefresh
+from yarl import URL
+
+# PCR computation, the strategy rule and the shared NSE constants live in app.py
+from app import HEADERS, NSE_COOKIE_TTL_SECONDS, NSE_HOME_URL, SYMBOLS, compute_oi_pcr_and_underlying, determine_signal
 
 # Set up logging to show debug information
 logging.basicConfig(level=logging.INFO)
 
-# --- Web Scraping and Calculation Functions ---
-def fetch_option_chain(symbol='BANKNIFTY'):
+# The browser headers from app.py plus the extras the NSE XHR endpoints expect.
+# No 'br': aiohttp can only decode brotli bodies when the optional Brotli package is installed.
+ASYNC_HEADERS = {
+    **HEADERS,
+    'Accept-Encoding': 'gzip, deflate',
+    'Upgrade-Insecure-Requests': '1',
+    'X-Requested-With': 'XMLHttpRequest',
+}
+
+# --- Web Scraping Functions ---
+# Every poll runs in a fresh event loop with its own aiohttp session, so the NSE cookies and the
+# time they were fetched are kept here between polls instead of in the session's cookie jar.
+@st.cache_resource
+def get_async_cookie_state():
+    """
+    Returns the NSE cookies and last-primed time carried over between polls.
+    """
+    return {'cookies': {}, 'primed_at': None}
+
+async def prime_nse_cookies_async(session, state, lock, rejected_at=None):
+    """
+    Visits the NSE homepage for fresh API cookies, unless the ones carried over are still current.
+    Pass rejected_at (a time.monotonic() value) when NSE refused a request sent at that time.
+    """
+    # The lock keeps the concurrent option chain fetches from all hitting the homepage at once
+    async with lock:
+        primed_at = state['primed_at']
+        if primed_at is not None:
+            if rejected_at is None and time.monotonic() - primed_at < NSE_COOKIE_TTL_SECONDS:
+                return
+            # Another fetch re-primed after the rejected request went out, so the cookies are already fresh
+            if rejected_at is not None and primed_at > rejected_at:
+                return
+        logging.info("Fetching cookies from NSE...")
+        async with session.get(NSE_HOME_URL) as response:
+            response.raise_for_status()
+        state['primed_at'] = time.monotonic()
+
+async def fetch_option_chain_async(session, state, lock, symbol='BANKNIFTY'):
     """
-    Fetches live option chain data from NSE with improved headers and session management.
+    Fetches live option chain data for one symbol, re-priming the NSE cookies once if they were rejected.
     """
     url = f"https://www.nseindia.com/api/option-chain-indices?symbol={symbol}"
     
-    headers = {
-        'Accept-Encoding': 'gzip, deflate, br',
-        'Accept-Language': 'en-US,en;q=0.9',
-        'Upgrade-Insecure-Requests': '1',
-        'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/108.0.0.0 Safari/537.36',
-        'X-Requested-With': 'XMLHttpRequest',
-    }
-    
-    session = requests.Session()
-    session.headers.update(headers)
+    logging.info("Fetching option chain for %s...", symbol)
+    sent_at = time.monotonic()
+    async with session.get(url) as response:
+        if response.status not in (401, 403):
+            response.raise_for_status()  # Raise an exception for bad status codes
+            return await response.json(content_type=None)
+
+    await prime_nse_cookies_async(session, state, lock, rejected_at=sent_at)
+    async with session.get(url) as response:
+        response.raise_for_status()
+        return await response.json(content_type=None)
+
+async def fetch_all_option_chains(symbols=SYMBOLS):
+    """
+    Fetches live option chain data from NSE for all symbols concurrently with aiohttp.
+    """
+    timeout = aiohttp.ClientTimeout(total=10)
+    state = get_async_cookie_state()
+    lock = asyncio.Lock()
+    nse_url = URL(NSE_HOME_URL)
     
     try:
-        logging.info(f"Fetching cookies from NSE...")
-        # First request to get cookies
-        session.get("https://www.nseindia.com", timeout=10)
-        
-        logging.info(f"Fetching option chain for {symbol}...")
-        # Second request to fetch the option chain data
-        response = session.get(url, timeout=10)
-        response.raise_for_status()  # Raise an exception for bad status codes
+        async with aiohttp.ClientSession(headers=ASYNC_HEADERS, timeout=timeout) as session:
+            session.cookie_jar.update_cookies(state['cookies'], response_url=nse_url)
+            # The homepage is only revisited once the carried-over cookies are older than the TTL.
+            # A failed warm-up is not fatal: each option chain fetch re-primes if NSE rejects it.
+            try:
+                await prime_nse_cookies_async(session, state, lock)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.warning("Could not fetch NSE cookies: %s", e)
+            
+            try:
+                # The option chain requests share the cookie jar and run concurrently
+                results = await asyncio.gather(*(fetch_option_chain_async(session, state, lock, symbol) for symbol in symbols))
+            finally:
+                # Keep whatever cookies NSE set or refreshed during this poll for the next one
+                state['cookies'] = session.cookie_jar.filter_cookies(nse_url)
         
         logging.info("Data fetched successfully.")
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        logging.error(f"Error fetching data from NSE: {e}")
+        return dict(zip(symbols, results))
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        logging.error("Error fetching data from NSE: %s", e)
         raise Exception(f"Failed to fetch data from NSE. Error: {e}")
 
-def compute_oi_pcr_and_underlying(data):
+# Cached just below the 5 second poll interval so concurrent sessions share one response
+@st.cache_data(ttl=4.5, show_spinner=False)
+def fetch_option_chains(symbols=SYMBOLS):
     """
-    Computes PCR and gets underlying price from the fetched data.
+    Fetches live option chain data from NSE for all symbols, reusing a recent response.
     """
-    if not data or 'records' not in data or 'data' not in data['records']:
-        return {'underlying': None, 'pcr_total': None, 'pcr_near': None, 'expiry': None}
-
-    expiry_dates = data['records']['expiryDates']
-    if not expiry_dates:
-        raise ValueError("No expiry dates found in the data.")
-        
-    current_expiry = expiry_dates[0]
-    
-    pe_total_oi = 0
-    ce_total_oi = 0
-    pe_near_oi = 0
-    ce_near_oi = 0
-
-    underlying_price = data['records']['underlyingValue']
-    
-    for item in data['records']['data']:
-        pe_total_oi += item.get('PE', {}).get('openInterest', 0)
-        ce_total_oi += item.get('CE', {}).get('openInterest', 0)
-        
-        # Check for near expiry data
-        if item.get('expiryDate') == current_expiry:
-            pe_near_oi += item.get('PE', {}).get('openInterest', 0)
-            ce_near_oi += item.get('CE', {}).get('openInterest', 0)
-
-    pcr_total = pe_total_oi / ce_total_oi if ce_total_oi != 0 else math.inf
-    pcr_near = pe_near_oi / ce_near_oi if ce_near_oi != 0 else math.inf
-
-    return {
-        'underlying': underlying_price,
-        'pcr_total': pcr_total,
-        'pcr_near': pcr_near,
-        'expiry': current_expiry
-    }
-
-# --- Strategy and UI Functions ---
-def determine_signal(pcr, trend, ema_signal):
-    """
-    Based on PCR, trend and EMA signal, determines the final trading signal.
-    """
-    signal = "SIDEWAYS"
-    suggested_option = None
-
-    if trend == "BULLISH" and ema_signal == "BUY" and pcr >= 1:
-        signal = "BUY"
-        suggested_option = "CALL"
-    elif trend == "BEARISH" and ema_signal == "SELL" and pcr <= 1:
-        signal = "SELL"
-        suggested_option = "PUT"
-    else:
-        signal = "SIDEWAYS"
-        suggested_option = None
-    return signal, suggested_option
+    return asyncio.run(fetch_all_option_chains(symbols))
 
+# --- UI Functions ---
 def display_dashboard(symbol, info):
     """
     Displays the dashboard for a given symbol.
@@ -124,10 +132,11 @@ def display_dashboard(symbol, info):
         ["BUY", "SELL"],
         index=0,
         horizontal=True,
-        help="Select 'BUY' for bullish EMA crossover or 'SELL' for bearish."
+        help="Select 'BUY' for bullish EMA crossover or 'SELL' for bearish.",
+        key=f"{symbol}_ema_signal"
     )
     
-    use_near_pcr = st.checkbox("Use Near Expiry PCR?", value=True)
+    use_near_pcr = st.checkbox("Use Near Expiry PCR?", value=True, key=f"{symbol}_use_near_pcr")
     
     pcr_used = info['pcr_near'] if use_near_pcr else info['pcr_total']
     trend = "BULLISH" if pcr_used >= 1 else "BEARISH"
@@ -161,33 +170,30 @@ def main():
         initial_sidebar_state="collapsed",
     )
     
+    # Rerun the script every 5 seconds instead of blocking it in a sleep loop
+    st_autorefresh(interval=5000, key="poller")
+    
     st.title("NSE Option Chain Analysis Dashboard")
     st.markdown("This dashboard provides live analysis of NIFTY and BANKNIFTY based on a custom trading strategy.")
 
-    symbol_choice = st.sidebar.radio(
-        "Select Symbol",
-        ["NIFTY", "BANKNIFTY"],
-        index=0
-    )
-    
-    dashboard_placeholder = st.empty()
-
-    while True:
-        try:
-            with st.spinner(f"Fetching live data for {symbol_choice}... Please wait."):
-                data = fetch_option_chain(symbol_choice)
-                info = compute_oi_pcr_and_underlying(data)
-            
-            info['last_update'] = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
-
-            with dashboard_placeholder.container():
-                display_dashboard(symbol_choice, info)
-
-        except Exception as e:
-            st.error(f"Error fetching data for {symbol_choice}: {e}")
-            st.info("Retrying in 5 seconds...")
-
-        time.sleep(5)
+    try:
+        with st.spinner("Fetching live data for NIFTY and BANKNIFTY... Please wait."):
+            chains = fetch_option_chains(SYMBOLS)
+    except Exception as e:
+        st.error(f"Error fetching data: {e}")
+        st.info("Retrying in 5 seconds...")
+        return
+
+    last_update = time.strftime("%Y-%m-%d %H:%M:%S")
+
+    for tab, symbol in zip(st.tabs(list(SYMBOLS)), SYMBOLS):
+        with tab:
+            try:
+                info = compute_oi_pcr_and_underlying(chains[symbol])
+                info['last_update'] = last_update
+                display_dashboard(symbol, info)
+            except Exception as e:
+                st.error(f"Error processing data for {symbol}: {e}")
 
 if __name__ == "__main__":
     main()